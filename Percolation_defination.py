@@ -1,9 +1,10 @@
 import networkx as nx
-import random
 import pickle
 import matplotlib.pyplot as plt
 import time
 
+from masked_graph import site_mask_keeping, masked_view, masked_connected_components
+
 # Load one month's data
 def load_monthly_network(month_to_load):
     file_path = f"monthly_networks/{month_to_load}.pkl"
@@ -12,12 +13,9 @@ def load_monthly_network(month_to_load):
 
     return loaded_graph
 
+# Site percolation keeping nodes with probability p, returns a read-only view of the graph
 def site_percolation(graph, p):
-    H = graph.copy()
-    for node in list(H.nodes()):
-        if random.random() > p:
-            H.remove_node(node)
-    return H
+    return masked_view(graph, hidden_nodes=site_mask_keeping(graph, p))
 
 def calculate_connectivity(H):
     
@@ -29,13 +27,13 @@ def calculate_connectivity(H):
         return len(components), 0
 
 def has_spanning_path(G, p, threshold_ratio=0.5):
-    H = site_percolation(G, p)
-    components = list(nx.connected_components(H))
+    removed_nodes = site_mask_keeping(G, p)
+    components = list(masked_connected_components(G, hidden_nodes=removed_nodes))
     if not components:
         return False
 
     largest_component = max(components, key=len)
-    if len(largest_component) >= threshold_ratio * H.number_of_nodes():
+    if len(largest_component) >= threshold_ratio * (G.number_of_nodes() - len(removed_nodes)):
         return True
     else:
         return False
@@ -3,12 +3,14 @@
 
 import time
 import pickle
-import random
 import pandas as pd
 import networkx as nx
 import multiprocessing as mp
 import matplotlib.pyplot as plt
 
+from structural_catalog import giant_component_size, refresh_catalog
+from masked_graph import bond_mask, self_loop_mask, masked_view, masked_largest_component_size
+
 # Load one month's data
 def load_monthly_network(month_to_load):
     file_path = f"monthly_networks/{month_to_load}.pkl"
@@ -17,45 +19,31 @@ def load_monthly_network(month_to_load):
 
     return loaded_graph
 
+# View of the graph without the self-loops, nothing is copied
 def remove_absorbing_edges(graph):
-    H = graph.copy()
-    for edge in list(H.edges()):
-        if edge[0] == edge[1]:
-            H.remove_edge(edge[0], edge[1])
-    return H
+    return masked_view(graph, hidden_edges=self_loop_mask(graph))
 
-# Bond percolation removing edges
+# Bond percolation removing edges, returns a read-only view of the graph
 def bond_percolation(graph, p):
-    H = graph.copy()
-    for edge in list(H.edges()):
-        if random.random() > p:
-            H.remove_edge(edge[0], edge[1])
-    return H
-
-def percolation_single_iteration(graph, removal_fraction):
-    # Create a copy of the original graph
-    percolated_graph = graph.copy()
+    return masked_view(graph, hidden_edges=bond_mask(graph, p))
 
-    # Calculate the initial component size
-    initial_components = list(nx.connected_components(graph))
-    initial_largest_component = max(initial_components, key=len)
-    initial_size = len(initial_largest_component)
+def percolation_single_iteration(graph, removal_fraction, initial_size=None):
+    # Calculate the initial component size, unless it was looked up in the catalog already
+    if initial_size is None:
+        initial_components = list(nx.connected_components(graph))
+        initial_largest_component = max(initial_components, key=len)
+        initial_size = len(initial_largest_component)
 
-    # Remove edges
-    percolated_graph = bond_percolation(percolated_graph, removal_fraction)
+    # Remove edges, only the removed edges are recorded instead of copying the graph
+    removed_edges = bond_mask(graph, removal_fraction)
 
     # Calculate the final component size
-    final_components = list(nx.connected_components(percolated_graph))
-    if final_components:
-        final_largest_component = max(final_components, key=len)
-        final_size = len(final_largest_component)
-    else:
-        final_size = 0
+    final_size = masked_largest_component_size(graph, hidden_edges=removed_edges)
 
     return initial_size, final_size
 
 # Percolation function for multiple iterations
-def percolation(graph, removal_fraction=0.1, num_iterations=100):
+def percolation(graph, removal_fraction=0.1, num_iterations=100, initial_size=None):
 
     # Create lists to store the initial and final component sizes
     initial_sizes = []
@@ -64,7 +52,7 @@ def percolation(graph, removal_fraction=0.1, num_iterations=100):
     # Use a ProcessPoolExecutor to parallelize the percolation process
     num_cores = mp.cpu_count()
     with mp.Pool(num_cores) as pool:
-        results = pool.starmap(percolation_single_iteration, [(graph, removal_fraction) for _ in range(num_iterations)])
+        results = pool.starmap(percolation_single_iteration, [(graph, removal_fraction, initial_size) for _ in range(num_iterations)])
 
     for initial_size, final_size in results:
         initial_sizes.append(initial_size)
@@ -82,10 +70,11 @@ def plot_percolation_curve(graph, month_to_load, num_iterations=100, removed_ran
     removal_fractions = [round(x * step, 5) for x in range(int(removed_range[0]/step), int(removed_range[1]/step)+1)]
     component_sizes = []
     initial_sizes = []
+    initial_size = giant_component_size(month_to_load)
 
     for removal_fraction in removal_fractions:
         tic = time.time()
-        avg_initial_size, avg_final_size = percolation(graph, removal_fraction, num_iterations)
+        avg_initial_size, avg_final_size = percolation(graph, removal_fraction, num_iterations, initial_size)
         toc = time.time()
         component_sizes.append(avg_final_size)
         initial_sizes.append(avg_initial_size)
@@ -103,6 +92,9 @@ def plot_percolation_curve(graph, month_to_load, num_iterations=100, removed_ran
     return
 
 def main():
+    # Make sure the catalog is up to date before the workers look up the initial sizes
+    refresh_catalog()
+
     # Generate date range from 1999-05 to 2002-05
     date_range = pd.date_range(start='1999-05', end='2002-06', freq='ME')
     formatted_dates = date_range.strftime('%Y-%m').tolist()
@@ -4,6 +4,8 @@ import random
 import matplotlib.pyplot as plt
 import time
 
+from structural_catalog import giant_component_size, refresh_catalog
+
 # Load one month's data
 def load_monthly_network(month_to_load):
     file_path = f"monthly_networks/{month_to_load}.pkl"
@@ -13,19 +15,20 @@ def load_monthly_network(month_to_load):
     return loaded_graph
 
 # Percolation function
-def percolation(graph, removal_fraction=0.1, num_iterations=100):
+def percolation(graph, removal_fraction=0.1, num_iterations=100, initial_size=None):
     initial_sizes = []
     final_sizes = []
 
-    for _ in range(num_iterations):
-        # Create a copy of the original graph
-        percolated_graph = graph.copy()
-
-        # Calculate the initial component size
+    # The initial component size is the same in every iteration, pass it in from the catalog or compute it once here
+    if initial_size is None:
         initial_components = list(nx.connected_components(graph))
         initial_largest_component = max(initial_components, key=len)
         initial_size = len(initial_largest_component)
 
+    for _ in range(num_iterations):
+        # Create a copy of the original graph
+        percolated_graph = graph.copy()
+
         # Calculate the number of nodes to remove
         num_nodes_to_remove = int(len(percolated_graph.nodes()) * removal_fraction)
 
@@ -52,16 +55,17 @@ def percolation(graph, removal_fraction=0.1, num_iterations=100):
 
     return avg_initial_size, avg_final_size
 
-def plot_percolation(graph):
+def plot_percolation(graph, month_to_load):
 
     # Create a list of fractions to remove
     removed_fraction = [round(x * 0.1, 2) for x in range(1, 11)]
     component_fraction = []
+    initial_size = giant_component_size(month_to_load)
 
     # Iterate over each fraction
     for fraction in removed_fraction:
         tic = time.time()
-        initial_size, final_size = percolation(graph, fraction)
+        initial_size, final_size = percolation(graph, fraction, initial_size=initial_size)
         print(f"Fraction: {fraction}, Initial size: {initial_size}, Final size: {final_size}")
         toc = time.time()
         print(f"Time taken: {toc - tic}")
@@ -77,11 +81,12 @@ def plot_percolation(graph):
 
 # Main function
 def main():
+    refresh_catalog()
     month_to_load = "2001-04"
     loaded_graph = load_monthly_network(month_to_load)
-    initial_size, new_size = percolation(loaded_graph)
+    initial_size, new_size = percolation(loaded_graph, initial_size=giant_component_size(month_to_load))
     print(f"Month: {month_to_load}, Initial size: {initial_size}, New size: {new_size}")
-    plot_percolation(loaded_graph)
+    plot_percolation(loaded_graph, month_to_load)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
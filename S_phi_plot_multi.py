@@ -4,12 +4,14 @@
 import concurrent.futures
 import pickle
 import networkx as nx
-import random
 import matplotlib.pyplot as plt
 import math
 import os
 import pandas as pd
 
+from structural_catalog import giant_component_size, refresh_catalog
+from masked_graph import site_mask, masked_view, masked_largest_component_size
+
 
 # Load one month's data
 def load_monthly_network(month_to_load):
@@ -19,46 +21,35 @@ def load_monthly_network(month_to_load):
 
     return loaded_graph
 
+# Site percolation removing nodes, returns a read-only view of the graph
 def site_percolation(graph, p):
-    H = graph.copy()
-    for node in list(H.nodes()):
-        if random.random() < p:
-            H.remove_node(node)
-    return H
+    return masked_view(graph, hidden_nodes=site_mask(graph, p))
 
 # Percolation functions
-def percolation_single_iteration(graph, removal_fraction):
-    # Create a copy of the original graph
-    percolated_graph = graph.copy()
-
-    # Calculate the initial component size
-    initial_components = list(nx.connected_components(graph))
-    initial_largest_component = max(initial_components, key=len)
-    initial_size = len(initial_largest_component)
-
-    # Remove nodes
-    percolated_graph = site_percolation(percolated_graph, removal_fraction)
+def percolation_single_iteration(graph, removal_fraction, initial_size=None):
+    # Calculate the initial component size, unless it was looked up in the catalog already
+    if initial_size is None:
+        initial_components = list(nx.connected_components(graph))
+        initial_largest_component = max(initial_components, key=len)
+        initial_size = len(initial_largest_component)
 
+    # Remove nodes, only the removed nodes are recorded instead of copying the graph
+    removed_nodes = site_mask(graph, removal_fraction)
 
     # Calculate the final component size
-    final_components = list(nx.connected_components(percolated_graph))
-    if final_components:
-        final_largest_component = max(final_components, key=len)
-        final_size = len(final_largest_component)
-    else:
-        final_size = 0
+    final_size = masked_largest_component_size(graph, hidden_nodes=removed_nodes)
 
     return initial_size, final_size
 
 
 # Percolation function for multiple iterations
-def percolation(graph, removal_fraction=0.1, num_iterations=100):
+def percolation(graph, removal_fraction=0.1, num_iterations=100, initial_size=None):
     initial_sizes = []
     final_sizes = []
 
     # Use a ProcessPoolExecutor to parallelize the percolation process
     with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
-        futures = [executor.submit(percolation_single_iteration, graph, removal_fraction) for _ in range(num_iterations)]
+        futures = [executor.submit(percolation_single_iteration, graph, removal_fraction, initial_size) for _ in range(num_iterations)]
         for future in concurrent.futures.as_completed(futures):
             initial_size, final_size = future.result()
             initial_sizes.append(initial_size)
@@ -79,10 +70,11 @@ def plot_percolation(graph, month_to_load, num_iterations=500, removed_range=(0.
     # Create a list of fractions to remove
     removed_fraction = [round(x * step, 2) for x in range(int(removed_range[0]/step), int(removed_range[1]/step)+1)]
     component_fraction = []
+    initial_size = giant_component_size(month_to_load)
 
     # Iterate over each fraction
     for fraction in removed_fraction:
-        avg_initial_size, avg_final_size = percolation(graph, fraction, num_iterations)
+        avg_initial_size, avg_final_size = percolation(graph, fraction, num_iterations, initial_size)
         true_size = math.ceil(avg_initial_size - nx.number_of_nodes(graph) * fraction)
         print(f"Fraction: {fraction}, True size: {true_size}, Final size: {avg_final_size}")
         # if true_size == 0:
@@ -109,6 +101,9 @@ def plot_percolation(graph, month_to_load, num_iterations=500, removed_range=(0.
 
 # Main function
 def main():
+    # Make sure the catalog is up to date before the workers look up the initial sizes
+    refresh_catalog()
+
     # Generate date range from 1999-01 to 2001-07
     date_range = pd.date_range(start='2001-07', end='2001-08', freq='ME')
     formatted_dates = date_range.strftime('%Y-%m').tolist()
@@ -0,0 +1,114 @@
+# This file is to build indexes from node position and edge label to node and edge ids for each month.
+# They are built once (build_network.py saves them next to the .pkl of the graph) so that a percolation
+# run on a subpopulation, e.g. only the "Urgent" emails or only the managers, can pick its edges
+# without scanning G.edges(data=True) and copying a subgraph every time.
+# The ids are the ones of batched_percolation.graph_to_arrays, so the selection goes straight into that engine.
+
+import os
+import time
+import pickle
+import numpy as np
+
+from batched_percolation import load_monthly_network, graph_to_arrays, batched_percolation_arrays
+
+def index_path(month):
+    return f"monthly_networks/{month}_index.pkl"
+
+# Group the ids by attribute value, each value gets a sorted int64 array of ids
+def invert(values):
+    groups = {}
+    for i, value in enumerate(values):
+        groups.setdefault(value, []).append(i)
+    return {value: np.array(ids, dtype=np.int64) for value, ids in groups.items()}
+
+def build_attribute_index(graph):
+    nodes, edge_u, edge_v = graph_to_arrays(graph)
+    # Same order as graph_to_arrays, self-loops are not in the index either
+    edge_labels = [data.get('label') for u, v, data in graph.edges(data=True) if u != v]
+    node_positions = [graph.nodes[node].get('position') for node in nodes]
+
+    # Edges touching each node in CSR form, so the edges of a set of nodes are found without a full scan
+    ends = np.concatenate([edge_u, edge_v])
+    order = np.argsort(ends, kind='stable')
+    incident_edges = np.concatenate([np.arange(len(edge_u)), np.arange(len(edge_u))])[order]
+    incident_start = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends, minlength=len(nodes)), out=incident_start[1:])
+
+    return {
+        "nodes": nodes,
+        "edge_u": edge_u,
+        "edge_v": edge_v,
+        "edge_label": invert(edge_labels),
+        "node_position": invert(node_positions),
+        "incident_edges": incident_edges,
+        "incident_start": incident_start,
+    }
+
+def save_attribute_index(index, month):
+    with open(index_path(month), 'wb') as file:
+        pickle.dump(index, file)
+
+# Load the index of a month, it is built and saved the first time for months built before the indexes existed
+def load_attribute_index(month):
+    if os.path.exists(index_path(month)):
+        with open(index_path(month), 'rb') as file:
+            return pickle.load(file)
+    index = build_attribute_index(load_monthly_network(month))
+    save_attribute_index(index, month)
+    return index
+
+def edges_with_labels(index, labels):
+    arrays = [index["edge_label"][label] for label in labels if label in index["edge_label"]]
+    return np.unique(np.concatenate(arrays)) if arrays else np.zeros(0, dtype=np.int64)
+
+def nodes_with_positions(index, positions):
+    arrays = [index["node_position"][position] for position in positions if position in index["node_position"]]
+    return np.unique(np.concatenate(arrays)) if arrays else np.zeros(0, dtype=np.int64)
+
+# Edges with both ends in the node set, only the edges touching those nodes are looked at
+def edges_between(index, node_ids):
+    if len(node_ids) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = index["incident_start"][node_ids]
+    stops = index["incident_start"][node_ids + 1]
+    positions = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+    candidates = np.unique(index["incident_edges"][positions])
+    inside = np.isin(index["edge_u"][candidates], node_ids) & np.isin(index["edge_v"][candidates], node_ids)
+    return candidates[inside]
+
+# Renumber the nodes of the subset to 0 ... n-1 so the engine only allocates for the subset
+def subset_arrays(index, edge_ids, node_ids=None):
+    edge_u = index["edge_u"][edge_ids]
+    edge_v = index["edge_v"][edge_ids]
+    if node_ids is None:
+        node_ids = np.unique(np.concatenate([edge_u, edge_v]))
+    return len(node_ids), np.searchsorted(node_ids, edge_u), np.searchsorted(node_ids, edge_v)
+
+# Percolation on the emails with the given labels only (the nodes are the ones those emails touch)
+def label_filtered_percolation(index, labels, p, num_trials, kind="edges", memory_budget=256 * 2**20, seed=None):
+    num_nodes, edge_u, edge_v = subset_arrays(index, edges_with_labels(index, labels))
+    return batched_percolation_arrays(num_nodes, edge_u, edge_v, p, num_trials, kind, memory_budget, seed)
+
+# Percolation on the people with the given positions only, with the emails among them
+def position_filtered_percolation(index, positions, p, num_trials, kind="edges", memory_budget=256 * 2**20, seed=None):
+    node_ids = nodes_with_positions(index, positions)
+    num_nodes, edge_u, edge_v = subset_arrays(index, edges_between(index, node_ids), node_ids)
+    return batched_percolation_arrays(num_nodes, edge_u, edge_v, p, num_trials, kind, memory_budget, seed)
+
+def main():
+    index = load_attribute_index("2000-05")
+    print(f"Labels: { {label: len(ids) for label, ids in index['edge_label'].items()} }")
+    print(f"Positions: { {position: len(ids) for position, ids in index['node_position'].items()} }")
+
+    tic = time.time()
+    final_sizes = label_filtered_percolation(index, ["Urgent"], 0.5, 1000)
+    toc = time.time()
+    print(f"Urgent emails, Phi: 0.5, Final Size: {final_sizes.mean():.2f}, Time taken: {toc - tic:.2f} seconds")
+
+    tic = time.time()
+    final_sizes = position_filtered_percolation(index, ["manager"], 0.5, 1000)
+    toc = time.time()
+    print(f"Managers, Phi: 0.5, Final Size: {final_sizes.mean():.2f}, Time taken: {toc - tic:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
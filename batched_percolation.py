@@ -0,0 +1,170 @@
+# This file is to run a very large number of percolation trials at once with numpy instead of networkx.
+# The occupation masks of the trials (which edges or nodes are kept) are generated in tiles of trials
+# and kept bit-packed, 8 sites per byte. The random numbers are drawn a chunk of sites at a time and packed
+# right away, and the labelling unpacks one chunk at a time to pick the kept edges, so the full
+# trials x sites mask never exists unpacked. The tile and chunk sizes come from a memory budget, so the
+# memory stays the same whether we ask for 100 or 100000 trials.
+
+import time
+import pickle
+import numpy as np
+import networkx as nx
+
+# Load one month's data
+def load_monthly_network(month_to_load):
+    file_path = f"monthly_networks/{month_to_load}.pkl"
+    with open(file_path, 'rb') as file:
+        loaded_graph = pickle.load(file)
+
+    return loaded_graph
+
+# Turn the graph into integer arrays, self-loops are dropped since they never connect anything
+def graph_to_arrays(graph):
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = [(index[u], index[v]) for u, v in graph.edges() if u != v]
+    edge_array = np.array(edges, dtype=np.int64).reshape(-1, 2)
+    return nodes, edge_array[:, 0], edge_array[:, 1]
+
+# Split the memory budget into a tile of trials and a chunk of sites, the unit of work inside a tile.
+# Three quarters go to the arrays of the whole tile, counted per trial:
+#   - the packed mask, num_sites / 8 bytes
+#   - 40 bytes per kept edge: the two int64 node ids of the kept edges are first collected chunk by chunk
+#     and concatenated (2 x 16 bytes), then label_components holds them with root_u, root_v and lowest (5 x 8 bytes)
+#   - 64 bytes per node: labels, previous, jumped and the labels[labels] temporary (4 x 8), bincount (8),
+#     the unpacked node mask and the node weights for site percolation (1 + 8), and the reshaped maximum
+# The last quarter goes to one chunk, counted per (trial, site in chunk): the float64 random numbers and
+# their bool mask (9 bytes), or the unpacked bool masks (up to 3 bytes for site percolation) plus the
+# np.nonzero pair and the shifted ids of the edges kept in the chunk (32 bytes per kept edge).
+# kept_fraction is the expected fraction of kept edges plus a margin, not the worst case, so a low p gets big tiles.
+def trials_per_tile(num_nodes, num_edges, num_sites, kept_fraction, memory_budget=256 * 2**20):
+    bytes_per_trial = num_sites / 8 + 40 * kept_fraction * num_edges + 64 * num_nodes + 64
+    return max(1, int(0.75 * memory_budget // bytes_per_trial))
+
+def sites_per_chunk(tile_size, kept_fraction, memory_budget=256 * 2**20):
+    bytes_per_site = 9 + 32 * kept_fraction + 3
+    chunk = int(0.25 * memory_budget // (tile_size * bytes_per_site))
+    return max(8, chunk - chunk % 8)
+
+# Packed masks of one tile, each site is occupied with probability p. The random numbers are drawn
+# chunk by chunk and packed straight away, so the tile only ever exists as (trials, ceil(num_sites / 8)) bytes.
+# chunk_sites is a multiple of 8 so every chunk fills whole bytes.
+def packed_mask_tile(num_sites, p, num_trials, chunk_sites, rng):
+    packed_tile = np.empty((num_trials, (num_sites + 7) // 8), dtype=np.uint8)
+    for start in range(0, num_sites, chunk_sites):
+        stop = min(start + chunk_sites, num_sites)
+        packed_tile[:, start // 8:(stop + 7) // 8] = np.packbits(rng.random((num_trials, stop - start)) < p, axis=1)
+    return packed_tile
+
+# Unpack the bits of sites start ... stop-1 of every trial, start is a multiple of 8
+def unpack_sites(packed_tile, start, stop):
+    return np.unpackbits(packed_tile[:, start // 8:(stop + 7) // 8], axis=1, count=stop - start).view(bool)
+
+# Node ids of the kept edges of every trial in the tile, shifted to the trial's block of ids.
+# edge_mask(start, stop) gives the (trials, stop - start) bool mask of edges start ... stop-1,
+# so only one chunk of the mask is ever unpacked.
+def kept_edge_ids(num_nodes, edge_u, edge_v, edge_mask, chunk_edges):
+    kept_u, kept_v = [], []
+    for start in range(0, len(edge_u), chunk_edges):
+        stop = min(start + chunk_edges, len(edge_u))
+        trial, edge = np.nonzero(edge_mask(start, stop))
+        trial *= num_nodes
+        ids_u = edge_u[start:stop][edge]
+        ids_u += trial
+        ids_v = edge_v[start:stop][edge]
+        ids_v += trial
+        kept_u.append(ids_u)
+        kept_v.append(ids_v)
+    if not kept_u:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(kept_u), np.concatenate(kept_v)
+
+# Label the components of every trial of a tile at once.
+# The trials are put side by side as one big graph (trial t uses node ids t*num_nodes ... (t+1)*num_nodes-1),
+# then the roots are hooked together along the edges and shortcut until nothing changes.
+def label_components(num_nodes, num_trials, edge_u, edge_v):
+    labels = np.arange(num_nodes * num_trials, dtype=np.int64)
+    while True:
+        root_u = labels[edge_u]
+        root_v = labels[edge_v]
+        lowest = np.minimum(root_u, root_v)
+        previous = labels.copy()
+        np.minimum.at(labels, root_u, lowest)
+        np.minimum.at(labels, root_v, lowest)
+        # Pointer jumping, every node points straight to its root afterwards
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+# Size of the largest component of every trial in the tile, node_weights is 0 for removed nodes
+def largest_component_sizes(labels, num_nodes, num_trials, node_weights=None):
+    if num_nodes == 0:
+        return np.zeros(num_trials, dtype=np.int64)
+    sizes = np.bincount(labels, weights=node_weights, minlength=num_nodes * num_trials)
+    return sizes.reshape(num_trials, num_nodes).max(axis=1).astype(np.int64)
+
+# Bond percolation of one tile: edge i of trial t is kept if bit i of row t is set
+def bond_tile_sizes(packed_tile, num_nodes, edge_u, edge_v, chunk_edges):
+    num_trials = packed_tile.shape[0]
+    edge_mask = lambda start, stop: unpack_sites(packed_tile, start, stop)
+    kept_u, kept_v = kept_edge_ids(num_nodes, edge_u, edge_v, edge_mask, chunk_edges)
+    labels = label_components(num_nodes, num_trials, kept_u, kept_v)
+    return largest_component_sizes(labels, num_nodes, num_trials)
+
+# Site percolation of one tile: node i of trial t is kept if bit i of row t is set,
+# an edge is kept only if both of its ends are kept
+def site_tile_sizes(packed_tile, num_nodes, edge_u, edge_v, chunk_edges):
+    num_trials = packed_tile.shape[0]
+    node_mask = unpack_sites(packed_tile, 0, num_nodes)
+    edge_mask = lambda start, stop: node_mask[:, edge_u[start:stop]] & node_mask[:, edge_v[start:stop]]
+    kept_u, kept_v = kept_edge_ids(num_nodes, edge_u, edge_v, edge_mask, chunk_edges)
+    labels = label_components(num_nodes, num_trials, kept_u, kept_v)
+    return largest_component_sizes(labels, num_nodes, num_trials, node_mask.ravel().astype(np.float64))
+
+# Largest component size of every trial, for bond ("edges") or site ("nodes") percolation.
+# Each site is kept with probability p, like bond_percolation in S_phi_edges.py.
+def batched_percolation(graph, p, num_trials, kind="edges", memory_budget=256 * 2**20, seed=None):
+    nodes, edge_u, edge_v = graph_to_arrays(graph)
+    return batched_percolation_arrays(len(nodes), edge_u, edge_v, p, num_trials, kind, memory_budget, seed)
+
+def batched_percolation_arrays(num_nodes, edge_u, edge_v, p, num_trials, kind="edges", memory_budget=256 * 2**20, seed=None):
+    # An edge is kept with probability p in bond and p**2 in site percolation, plus a margin for the fluctuations
+    if kind == "edges":
+        num_sites, tile_sizes, kept_fraction = len(edge_u), bond_tile_sizes, min(1.0, p + 0.05)
+    elif kind == "nodes":
+        num_sites, tile_sizes, kept_fraction = num_nodes, site_tile_sizes, min(1.0, p * p + 0.05)
+    else:
+        raise ValueError(f"Unknown percolation kind: {kind}")
+
+    rng = np.random.default_rng(seed)
+    tile_size = trials_per_tile(num_nodes, len(edge_u), num_sites, kept_fraction, memory_budget)
+    chunk_sites = sites_per_chunk(tile_size, kept_fraction, memory_budget)
+    final_sizes = np.empty(num_trials, dtype=np.int64)
+    for start in range(0, num_trials, tile_size):
+        stop = min(start + tile_size, num_trials)
+        packed_tile = packed_mask_tile(num_sites, p, stop - start, chunk_sites, rng)
+        final_sizes[start:stop] = tile_sizes(packed_tile, num_nodes, edge_u, edge_v, chunk_sites)
+    return final_sizes
+
+# Same output as percolation() in S_phi_edges.py, but for any number of trials
+def percolation(graph, removal_fraction=0.1, num_iterations=100, kind="edges", memory_budget=256 * 2**20, seed=None):
+    initial_size = len(max(nx.connected_components(graph), key=len))
+    final_sizes = batched_percolation(graph, removal_fraction, num_iterations, kind, memory_budget, seed)
+    return initial_size, final_sizes.mean()
+
+def main():
+    G = load_monthly_network("2000-05")
+    num_iterations = 10000
+    print(f"Number of nodes: {G.number_of_nodes()}, Number of edges: {G.number_of_edges()}")
+    for p in [0.01, 0.05, 0.1, 0.5]:
+        tic = time.time()
+        initial_size, final_size = percolation(G, p, num_iterations, memory_budget=64 * 2**20)
+        toc = time.time()
+        print(f"Phi: {p}, Initial Size: {initial_size}, Final Size: {final_size:.2f}, Time taken: {toc - tic:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,35 @@
 import os
+import json
+import hashlib
 import pickle
 import pandas as pd
 import networkx as nx
 
-data = pd.read_csv("cs_proj_enron.csv")
+from attribute_index import build_attribute_index, save_attribute_index, index_path
 
-data['Date'] = pd.to_datetime(data['Date'], infer_datetime_format=True)
+MANIFEST_PATH = "monthly_networks/manifest.json"
 
-data['YearMonth'] = data['Date'].dt.to_period('M')
-unique_months = data['YearMonth'].unique()
+# The columns a month's graph is built from, a change in any of them changes the fingerprint
+SOURCE_COLUMNS = ['Date', 'From_copy', 'To_copy', 'from_position_copy', 'to_position', 'content', 'labels']
+# Bump this when build_month_network changes what it stores, so every month is rebuilt once
+BUILD_VERSION = 2
 
-# Create a dictionary to store each monthly network
-monthly_networks = {}
+def load_data(csv_path="cs_proj_enron.csv"):
+    data = pd.read_csv(csv_path)
 
-# Iterate over each unique month to create networks
-for month in unique_months:
-    # Filter data for the current month
-    monthly_data = data[data['YearMonth'] == month]
+    data['Date'] = pd.to_datetime(data['Date'], infer_datetime_format=True)
 
+    data['YearMonth'] = data['Date'].dt.to_period('M')
+    return data
+
+# Hash of the month's rows in file order, the order matters since it is the order of the edges
+def month_fingerprint(monthly_data):
+    row_hashes = pd.util.hash_pandas_object(monthly_data[SOURCE_COLUMNS], index=False)
+    digest = hashlib.sha256(row_hashes.to_numpy().tobytes())
+    digest.update(f"{len(monthly_data)}:{BUILD_VERSION}".encode())
+    return digest.hexdigest()
+
+def build_month_network(monthly_data):
     # Create a directed graph
     G = nx.MultiGraph()
 
@@ -33,21 +45,83 @@ for month in unique_months:
         G.add_node(to_email, position=to_position)
 
         # Add a directed edge representing the email, with content and label as attributes
-        G.add_edge(from_email, to_email, content=row['content'], label=row['labels'])
+        # The date and sender are kept for the time-respecting analysis in temporal_percolation.py
+        G.add_edge(from_email, to_email, content=row['content'], label=row['labels'], date=row['Date'], sender=from_email)
 
-    # Store the graph in the dictionary with the month as the key
-    monthly_networks[str(month)] = G
+    return G
 
-# Output a message indicating that the networks have been created
-print("Finished creating networks. Each network contains email information for one month.")
+# The manifest maps each month to the fingerprint of the rows its files were built from.
+# Downstream caches can keep the fingerprint they were computed from and only redo the months where it differs.
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
 
+def save_manifest(manifest, path=MANIFEST_PATH):
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temporary_path, path)
 
-if __name__ == "__main__":
-    os.makedirs("monthly_networks", exist_ok=True)
+# Months whose fingerprint is not the one a cache was built from, including cached months which are gone from the data
+def changed_months(cached_fingerprints, manifest=None):
+    manifest = load_manifest() if manifest is None else manifest
+    changed = {month for month, entry in manifest.items() if cached_fingerprints.get(month) != entry['fingerprint']}
+    removed = {month for month in cached_fingerprints if month not in manifest}
+    return sorted(changed | removed)
 
-    for month, graph in monthly_networks.items():
+# Rebuild and rewrite only the months whose rows changed since the last build,
+# and delete the files of the months which are not in the data anymore
+def build_networks(data, force=False):
+    manifest = load_manifest()
+    rebuilt = []
+    months_in_data = set()
+
+    # Iterate over each unique month to create networks
+    for month, monthly_data in data.groupby('YearMonth', sort=True):
+        month = str(month)
+        months_in_data.add(month)
+        fingerprint = month_fingerprint(monthly_data)
         file_path = f"monthly_networks/{month}.pkl"
+        if not force and manifest.get(month, {}).get('fingerprint') == fingerprint and os.path.exists(file_path):
+            continue
+
+        graph = build_month_network(monthly_data)
         with open(file_path, 'wb') as file:
             pickle.dump(graph, file)
 
-    print("All networks have been saved as .pkl files.")
\ No newline at end of file
+        # Save the position and label indexes next to the graph
+        save_attribute_index(build_attribute_index(graph), month)
+
+        manifest[month] = {'fingerprint': fingerprint, 'num_rows': len(monthly_data)}
+        # Written after every month, so an interrupted build keeps what it has done
+        save_manifest(manifest)
+        rebuilt.append(month)
+
+    removed = sorted(month for month in manifest if month not in months_in_data)
+    for month in removed:
+        for file_path in (f"monthly_networks/{month}.pkl", index_path(month)):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        del manifest[month]
+    if removed:
+        save_manifest(manifest)
+
+    return rebuilt, removed
+
+
+if __name__ == "__main__":
+    os.makedirs("monthly_networks", exist_ok=True)
+
+    data = load_data()
+    rebuilt, removed = build_networks(data)
+
+    # Update the structural catalog of the rebuilt months, imported here since it imports this file
+    from structural_catalog import refresh_catalog
+    refresh_catalog()
+
+    # Output a message indicating which networks have been created
+    print(f"Rebuilt {len(rebuilt)} monthly networks: {rebuilt}")
+    print(f"Removed {len(removed)} monthly networks which are not in the data anymore: {removed}")
+    print("All changed networks have been saved as .pkl files.")
\ No newline at end of file
@@ -0,0 +1,70 @@
+# This file is to do the networkx percolation without copying the graph in every trial.
+# graph.copy() duplicates every node and edge attribute dict (with the whole email content) before
+# anything is removed. Here a trial only draws which nodes or edges are hidden, and the graph is seen
+# through a read-only nx.subgraph_view, or searched directly by masked_connected_components.
+# The random numbers are drawn in the same order as the old copy-and-remove functions.
+
+import random
+import networkx as nx
+
+# Nodes removed by site percolation, a node is removed if random.random() < p
+def site_mask(graph, p):
+    return {node for node in list(graph.nodes()) if random.random() < p}
+
+# Nodes removed when each node is kept with probability p, as in Percolation_defination.py
+def site_mask_keeping(graph, p):
+    return {node for node in list(graph.nodes()) if random.random() > p}
+
+# Edges removed by bond percolation, an edge is removed if random.random() > p.
+# Both orientations are in the set since the graph is undirected.
+def bond_mask(graph, p):
+    if graph.is_multigraph():
+        removed = [(u, v, key) for u, v, key in graph.edges(keys=True) if random.random() > p]
+        return {edge for u, v, key in removed for edge in ((u, v, key), (v, u, key))}
+    removed = [(u, v) for u, v in graph.edges() if random.random() > p]
+    return {edge for u, v in removed for edge in ((u, v), (v, u))}
+
+def self_loop_mask(graph):
+    if graph.is_multigraph():
+        return {(u, v, key) for u, v, key in nx.selfloop_edges(graph, keys=True)}
+    return {(u, v) for u, v in nx.selfloop_edges(graph)}
+
+# Read-only view of the graph without the hidden nodes and edges, nothing is copied
+def masked_view(graph, hidden_nodes=(), hidden_edges=()):
+    hidden_nodes = set(hidden_nodes)
+    hidden_edges = set(hidden_edges)
+    if graph.is_multigraph():
+        filter_edge = lambda u, v, key: (u, v, key) not in hidden_edges
+    else:
+        filter_edge = lambda u, v: (u, v) not in hidden_edges
+    return nx.subgraph_view(graph, filter_node=lambda node: node not in hidden_nodes, filter_edge=filter_edge)
+
+# Same components as nx.connected_components(masked_view(...)), but walking the original adjacency
+def masked_connected_components(graph, hidden_nodes=(), hidden_edges=()):
+    seen = set(hidden_nodes)
+    multigraph = graph.is_multigraph()
+    adjacency = graph.adj
+    for source in graph:
+        if source in seen:
+            continue
+        seen.add(source)
+        component = {source}
+        frontier = [source]
+        while frontier:
+            node = frontier.pop()
+            for neighbor, edges in adjacency[node].items():
+                if neighbor in seen:
+                    continue
+                if hidden_edges:
+                    # Between two nodes of a multigraph, one kept parallel edge is enough
+                    if multigraph and all((node, neighbor, key) in hidden_edges for key in edges):
+                        continue
+                    if not multigraph and (node, neighbor) in hidden_edges:
+                        continue
+                seen.add(neighbor)
+                component.add(neighbor)
+                frontier.append(neighbor)
+        yield component
+
+def masked_largest_component_size(graph, hidden_nodes=(), hidden_edges=()):
+    return max((len(component) for component in masked_connected_components(graph, hidden_nodes, hidden_edges)), default=0)
@@ -5,6 +5,8 @@ import matplotlib.pyplot as plt
 import networkx as nx
 import pandas as pd
 
+from structural_catalog import giant_component_size, max_degree_node, refresh_catalog
+
 def load_monthly_network(month_to_load):
     file_path = f"monthly_networks/{month_to_load}.pkl"
     with open(file_path, 'rb') as file:
@@ -21,6 +23,8 @@ def remove_node(graph):
     graph.remove_node(highest_centrality_node)
 
 def plot_network():
+    refresh_catalog()
+
     # Generate date range from 1999-01 to 2001-07
     date_range = pd.date_range(start='1999-01', end='2001-08', freq='ME')
     formatted_dates = date_range.strftime('%Y-%m').tolist()
@@ -29,10 +33,11 @@ def plot_network():
     fraction = []
     for month in formatted_dates:
         loaded_graph = load_monthly_network(month)
-        largest_component = max(nx.connected_components(loaded_graph), key=len)
-        remove_node(loaded_graph)
+        # The largest component and the highest centrality node come from the catalog
+        largest_component_size = giant_component_size(month)
+        loaded_graph.remove_node(max_degree_node(month))
         largest_component_after = max(nx.connected_components(loaded_graph), key=len)
-        fraction.append(len(largest_component_after)/len(largest_component))
+        fraction.append(len(largest_component_after)/largest_component_size)
 
     # Plot the fraction of the largest connected component over time
     plt.plot(date_range, fraction)
@@ -44,4 +49,5 @@ def plot_network():
     return
 
 
-plot_network()
+if __name__ == "__main__":
+    plot_network()
@@ -0,0 +1,166 @@
+# This file is to compute the structural statistics of every month once and keep them in one file,
+# so the plotting and percolation scripts can look them up instead of recomputing them on every run.
+# The catalog is a single columnar .npz file: one array per column, one row per month. The columns
+# holding a distribution are stored as a flat array of values plus the offset of each month in it.
+# Each month is recomputed only when its fingerprint in the build manifest (or the hash of its .pkl) changes.
+
+import os
+import glob
+import hashlib
+import pickle
+import concurrent.futures
+import numpy as np
+import networkx as nx
+
+from build_network import load_manifest
+
+CATALOG_PATH = "monthly_networks/catalog.npz"
+
+SCALAR_COLUMNS = ["num_nodes", "num_edges", "num_self_loops", "giant_component_size", "num_components", "max_core"]
+# Distributions are stored as {value: count} histograms
+HISTOGRAM_COLUMNS = ["multiplicity", "degree", "component_size", "core_number"]
+STRING_COLUMNS = ["month", "source_hash", "max_degree_node"]
+
+# Load one month's data
+def load_monthly_network(month_to_load):
+    file_path = f"monthly_networks/{month_to_load}.pkl"
+    with open(file_path, 'rb') as file:
+        loaded_graph = pickle.load(file)
+
+    return loaded_graph
+
+def available_months():
+    paths = glob.glob("monthly_networks/[0-9][0-9][0-9][0-9]-[0-9][0-9].pkl")
+    return sorted(os.path.basename(path)[:-len(".pkl")] for path in paths)
+
+def file_hash(month):
+    digest = hashlib.sha256()
+    with open(f"monthly_networks/{month}.pkl", 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# The fingerprint of the source rows from build_network.py, months built before the manifest existed use the file hash
+def source_fingerprint(month, manifest):
+    if month in manifest:
+        return manifest[month]['fingerprint']
+    return file_hash(month)
+
+def histogram(values):
+    values, counts = np.unique(np.asarray(list(values), dtype=np.int64), return_counts=True)
+    return {int(value): int(count) for value, count in zip(values, counts)}
+
+# All the statistics of one month
+def compute_month_stats(month, fingerprint):
+    graph = load_monthly_network(month)
+    simple_graph = nx.Graph(graph)
+    simple_graph.remove_edges_from(list(nx.selfloop_edges(simple_graph)))
+
+    component_sizes = [len(component) for component in nx.connected_components(graph)]
+    degrees = dict(graph.degree())
+    # Same node as max(nx.degree_centrality(graph)) in read_network.remove_node
+    max_degree_node = max(degrees, key=degrees.get) if degrees else ""
+    core_numbers = nx.core_number(simple_graph)
+    multiplicities = [graph.number_of_edges(u, v) for u, v in nx.Graph(graph).edges()]
+
+    return {
+        "month": month,
+        "source_hash": fingerprint,
+        "max_degree_node": str(max_degree_node),
+        "num_nodes": graph.number_of_nodes(),
+        "num_edges": graph.number_of_edges(),
+        "num_self_loops": nx.number_of_selfloops(graph),
+        "giant_component_size": max(component_sizes, default=0),
+        "num_components": len(component_sizes),
+        "max_core": max(core_numbers.values(), default=0),
+        "multiplicity": histogram(multiplicities),
+        "degree": histogram(degrees.values()),
+        "component_size": histogram(component_sizes),
+        "core_number": histogram(core_numbers.values()),
+    }
+
+# Columns -> list of per-month dicts
+def read_catalog(path=CATALOG_PATH):
+    if not os.path.exists(path):
+        return {}
+    # Each array is read from the file once, indexing the NpzFile directly would reload the column every time
+    with np.load(path, allow_pickle=False) as npz_file:
+        columns = {name: npz_file[name] for name in npz_file.files}
+    rows = {}
+    for i, month in enumerate(columns["month"]):
+        row = {name: str(columns[name][i]) for name in STRING_COLUMNS}
+        row.update({name: int(columns[name][i]) for name in SCALAR_COLUMNS})
+        for name in HISTOGRAM_COLUMNS:
+            start, stop = columns[f"{name}_offsets"][i], columns[f"{name}_offsets"][i + 1]
+            values = columns[f"{name}_values"][start:stop]
+            counts = columns[f"{name}_counts"][start:stop]
+            row[name] = {int(value): int(count) for value, count in zip(values, counts)}
+        rows[str(month)] = row
+    return rows
+
+# Per-month dicts -> columns, written to a temporary file first so readers never see half a catalog
+def write_catalog(rows, path=CATALOG_PATH):
+    months = sorted(rows)
+    columns = {name: np.array([rows[month][name] for month in months], dtype=str) for name in STRING_COLUMNS}
+    columns.update({name: np.array([rows[month][name] for month in months], dtype=np.int64) for name in SCALAR_COLUMNS})
+    for name in HISTOGRAM_COLUMNS:
+        histograms = [rows[month][name] for month in months]
+        columns[f"{name}_values"] = np.array([value for hist in histograms for value in hist], dtype=np.int64)
+        columns[f"{name}_counts"] = np.array([count for hist in histograms for count in hist.values()], dtype=np.int64)
+        columns[f"{name}_offsets"] = np.cumsum([0] + [len(hist) for hist in histograms]).astype(np.int64)
+
+    temporary_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(temporary_path, **columns)
+    os.replace(temporary_path, path)
+
+# Recompute the months which are new or whose .pkl changed, drop the months which are gone
+def refresh_catalog(path=CATALOG_PATH, max_workers=None):
+    months = available_months()
+    rows = read_catalog(path)
+    manifest = load_manifest()
+    fingerprints = {month: source_fingerprint(month, manifest) for month in months}
+    stale = [month for month in months if month not in rows or rows[month]["source_hash"] != fingerprints[month]]
+    removed = [month for month in rows if month not in months]
+
+    if stale:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            for row in executor.map(compute_month_stats, stale, [fingerprints[month] for month in stale]):
+                rows[row["month"]] = row
+    for month in removed:
+        del rows[month]
+    if stale or removed or not os.path.exists(path):
+        write_catalog(rows, path)
+    return stale
+
+_catalog = None
+_checked_months = set()
+
+# Lookup API, read-only: the catalog is read once per process and each month is checked against its
+# fingerprint the first time it is looked up. Refreshing is done by running this file (or refresh_catalog).
+def month_stats(month):
+    global _catalog
+    if _catalog is None:
+        _catalog = read_catalog()
+    if month not in _checked_months:
+        if month not in _catalog:
+            raise ValueError(f"Month {month} is not in the catalog, run structural_catalog.py to refresh it")
+        if _catalog[month]["source_hash"] != source_fingerprint(month, load_manifest()):
+            raise ValueError(f"The catalog entry of month {month} is stale, run structural_catalog.py to refresh it")
+        _checked_months.add(month)
+    return _catalog[month]
+
+def giant_component_size(month):
+    return month_stats(month)["giant_component_size"]
+
+def max_degree_node(month):
+    return month_stats(month)["max_degree_node"]
+
+def main():
+    refreshed = refresh_catalog()
+    print(f"Refreshed {len(refreshed)} months: {refreshed}")
+    for month, row in sorted(read_catalog().items()):
+        print(f"Month: {month}, Nodes: {row['num_nodes']}, Edges: {row['num_edges']}, Self-loops: {row['num_self_loops']}, "
+              f"Giant component: {row['giant_component_size']}, Components: {row['num_components']}, Max core: {row['max_core']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# This file is to do percolation on time-respecting paths: information can only go from a sender to a
+# recipient at the time of the email, and onwards only through emails sent later.
+# Instead of one search per source, the emails are processed once in time order and every node keeps
+# the set of sources which can reach it, as a bitset. An email u -> v does reach[v] |= reach[u], which
+# updates all the sources (and all the percolation trials) at once.
+# Emails with the same date are processed as one batch: all the senders are read before any recipient
+# is written, so information never goes through two emails sent at the same time.
+
+import time
+import pickle
+import numpy as np
+import pandas as pd
+
+# Load one month's data
+def load_monthly_network(month_to_load):
+    file_path = f"monthly_networks/{month_to_load}.pkl"
+    with open(file_path, 'rb') as file:
+        loaded_graph = pickle.load(file)
+
+    return loaded_graph
+
+# Time-sorted event stream (time, sender id, recipient id) of a month, self-loops are dropped
+def graph_to_events(graph):
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    events = []
+    for u, v, data in graph.edges(data=True):
+        if 'date' not in data:
+            raise ValueError("The graph has no email dates, rebuild it with build_network.py")
+        if u == v:
+            continue
+        sender = data['sender']
+        recipient = v if sender == u else u
+        events.append((pd.Timestamp(data['date']).value, index[sender], index[recipient]))
+
+    events.sort(key=lambda event: event[0])
+    event_array = np.array(events, dtype=np.int64).reshape(-1, 3)
+    return nodes, event_array[:, 0], event_array[:, 1], event_array[:, 2]
+
+# How many trials fit in the memory budget. Each trial needs one bit per (node, source),
+# the unpacked bits of one chunk of nodes, and the random numbers and masks of the emails.
+def trials_per_tile(num_nodes, num_events, memory_budget=256 * 2**20):
+    words = (num_nodes + 63) // 64
+    bytes_per_trial = 8 * num_nodes * words + 4096 * words + 17 * num_events
+    return max(1, int(memory_budget // bytes_per_trial))
+
+# Sources reaching each node: reach[node, trial] is a bitset of the sources, in uint64 words.
+# keep[trial, event] says if the email is kept in that trial (bond percolation on the emails).
+def propagate(num_nodes, times, senders, recipients, keep, directed=True):
+    num_trials = keep.shape[0]
+    words = (num_nodes + 63) // 64
+    reach = np.zeros((num_nodes, num_trials, words), dtype=np.uint64)
+    nodes = np.arange(num_nodes)
+    reach[nodes, :, nodes // 64] = np.left_shift(np.uint64(1), (nodes % 64).astype(np.uint64))[:, None]
+
+    # All ones for a kept email and zero otherwise, so the AND drops the email in the trials where it is removed
+    keep_words = (-keep.astype(np.int64)).astype(np.uint64).T[:, :, None]
+    batch_starts = np.concatenate([[0], np.flatnonzero(np.diff(times)) + 1, [len(times)]])
+    for start, stop in zip(batch_starts[:-1], batch_starts[1:]):
+        batch_senders = senders[start:stop]
+        batch_recipients = recipients[start:stop]
+        # Everything is read from the reach before this date, then written
+        incoming = reach[batch_senders] & keep_words[start:stop]
+        if not directed:
+            outgoing = reach[batch_recipients] & keep_words[start:stop]
+            np.bitwise_or.at(reach, batch_senders, outgoing)
+        np.bitwise_or.at(reach, batch_recipients, incoming)
+    return reach
+
+# Out-component size of every source (how many nodes it can reach, itself included), shape (trials, nodes)
+def out_component_sizes(reach, num_nodes, chunk=64):
+    num_trials = reach.shape[1]
+    sizes = np.zeros((num_trials, num_nodes), dtype=np.int64)
+    for start in range(0, num_nodes, chunk):
+        bits = np.unpackbits(reach[start:start + chunk].view(np.uint8), axis=-1, bitorder='little')
+        sizes += bits[:, :, :num_nodes].sum(axis=0, dtype=np.int64)
+    return sizes
+
+# Out-component sizes of every source in every trial, each email is kept with probability p
+def temporal_percolation_events(num_nodes, times, senders, recipients, p, num_trials, directed=True, memory_budget=256 * 2**20, seed=None):
+    rng = np.random.default_rng(seed)
+    tile_size = trials_per_tile(num_nodes, len(senders), memory_budget)
+    sizes = np.empty((num_trials, num_nodes), dtype=np.int64)
+    for start in range(0, num_trials, tile_size):
+        stop = min(start + tile_size, num_trials)
+        keep = rng.random((stop - start, len(senders))) < p
+        reach = propagate(num_nodes, times, senders, recipients, keep, directed)
+        sizes[start:stop] = out_component_sizes(reach, num_nodes)
+    return sizes
+
+def temporal_percolation(graph, p=1.0, num_trials=1, directed=True, memory_budget=256 * 2**20, seed=None):
+    nodes, times, senders, recipients = graph_to_events(graph)
+    return temporal_percolation_events(len(nodes), times, senders, recipients, p, num_trials, directed, memory_budget, seed)
+
+# Temporal giant component = the largest out-component, averaged over the trials,
+# and the distribution of the out-component sizes over all sources and trials
+def temporal_giant_component(graph, p=1.0, num_trials=1, directed=True, memory_budget=256 * 2**20, seed=None):
+    sizes = temporal_percolation(graph, p, num_trials, directed, memory_budget, seed)
+    values, counts = np.unique(sizes, return_counts=True)
+    distribution = {int(value): int(count) for value, count in zip(values, counts)}
+    return sizes.max(axis=1).mean(), distribution
+
+def main():
+    # Generate date range from 1999-05 to 2002-05
+    date_range = pd.date_range(start='1999-05', end='2002-06', freq='ME')
+    formatted_dates = date_range.strftime('%Y-%m').tolist()
+    for month in formatted_dates:
+        loaded_graph = load_monthly_network(month)
+        tic = time.time()
+        giant_size, distribution = temporal_giant_component(loaded_graph)
+        curve = [temporal_giant_component(loaded_graph, phi, 100)[0] for phi in [0.25, 0.5, 0.75]]
+        toc = time.time()
+        print(f"Month: {month}, Nodes: {loaded_graph.number_of_nodes()}, Temporal giant component: {giant_size}, "
+              f"Phi 0.25/0.5/0.75: {curve}, Time taken: {toc - tic:.2f} seconds")
+        print(f"Out-component distribution: {distribution}")
+
+if __name__ == "__main__":
+    main()
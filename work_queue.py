@@ -0,0 +1,314 @@
+# This file is a small work queue to spread the big percolation sweeps over several processes or machines.
+# The coordinator writes (month, phi, seed range) tasks into a SQLite file, and any number of workers
+# claim a task with a lease, run it and commit the result. Every task carries the fingerprint of its
+# month from the build manifest, so the results of a month which was rebuilt are never mixed with new ones. If a worker dies, its lease runs out and
+# the task is handed to another worker. The SQLite file only needs to be on a shared disk, no server.
+#
+# Usage:
+#   python work_queue.py submit queue.db --kind edges --trials 500 --chunk 50
+#   python work_queue.py worker queue.db            (run this on every machine)
+#   python work_queue.py local queue.db --workers 8 (several local workers instead of nodes)
+#   python work_queue.py collect queue.db
+
+import os
+import json
+import hashlib
+import time
+import socket
+import random
+import sqlite3
+import threading
+import argparse
+import pandas as pd
+import multiprocessing as mp
+
+import S_phi_edges
+import S_phi_plot_multi
+from build_network import load_manifest
+from structural_catalog import giant_component_size, refresh_catalog, source_fingerprint
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# "edges" is the bond percolation of S_phi_edges.py, "nodes" is the site percolation of S_phi_plot_multi.py
+TASK_KINDS = {
+    "edges": S_phi_edges.percolation_single_iteration,
+    "nodes": S_phi_plot_multi.percolation_single_iteration,
+}
+
+# Connect to the queue file, waiting for other writers instead of failing right away
+def connect(db_path, timeout=60.0):
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = %d" % int(timeout * 1000))
+    return conn
+
+def create_queue(db_path):
+    conn = connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            month TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            phi REAL NOT NULL,
+            seed_start INTEGER NOT NULL,
+            seed_stop INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            UNIQUE (kind, month, fingerprint, phi, seed_start)
+        )""")
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+    if "fingerprint" not in columns:
+        conn.close()
+        raise ValueError(f"{db_path} was made by an older version of work_queue.py, start a new queue file")
+    conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until)")
+    conn.close()
+
+# Split num_trials into seed ranges of at most chunk trials and write one task per (month, phi, range).
+# Tasks of a month whose fingerprint changed since an earlier submit are deleted, done or not, since
+# their results come from the old network.
+def submit_sweep(db_path, kind, months, phis, num_trials, chunk=50, base_seed=0):
+    if kind not in TASK_KINDS:
+        raise ValueError(f"Unknown task kind: {kind}")
+    # The workers only read the catalog, so it is refreshed once here by the coordinator
+    refresh_catalog()
+    create_queue(db_path)
+    manifest = load_manifest()
+    fingerprints = {month: source_fingerprint(month, manifest) for month in months}
+    rows = []
+    for month in months:
+        for phi in phis:
+            for seed_start in range(base_seed, base_seed + num_trials, chunk):
+                seed_stop = min(seed_start + chunk, base_seed + num_trials)
+                rows.append((kind, month, fingerprints[month], float(phi), seed_start, seed_stop))
+
+    conn = connect(db_path)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("DELETE FROM tasks WHERE kind = ? AND month = ? AND fingerprint != ?",
+                         [(kind, month, fingerprint) for month, fingerprint in fingerprints.items()])
+        # Tasks of an unchanged month which are already in the queue are kept with their results
+        conn.executemany("INSERT OR IGNORE INTO tasks (kind, month, fingerprint, phi, seed_start, seed_stop) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+    return len(rows)
+
+# Take the oldest available task: pending, or running with an expired lease (its worker is gone)
+def claim_task(db_path, worker_id, lease_seconds=600.0, max_attempts=3):
+    conn = connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        row = conn.execute("""
+            SELECT id, kind, month, fingerprint, phi, seed_start, seed_stop FROM tasks
+            WHERE (status = ? OR (status = ? AND lease_until < ?)) AND attempts < ?
+            ORDER BY id LIMIT 1""", (PENDING, RUNNING, now, max_attempts)).fetchone()
+        if row is None:
+            # Expired tasks which used up all their attempts will never be picked again
+            conn.execute("UPDATE tasks SET status = ?, error = 'lease expired too many times' WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                         (FAILED, RUNNING, now, max_attempts))
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                     (RUNNING, worker_id, now + lease_seconds, row[0]))
+        conn.execute("COMMIT")
+    except Exception:
+        # BEGIN IMMEDIATE itself may have failed, then there is nothing to roll back
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    task_id, kind, month, fingerprint, phi, seed_start, seed_stop = row
+    return {"id": task_id, "kind": kind, "month": month, "fingerprint": fingerprint, "phi": phi,
+            "seed_start": seed_start, "seed_stop": seed_stop}
+
+# Extend the lease of a long task, returns False if the task was given to someone else meanwhile
+def renew_lease(db_path, task_id, worker_id, lease_seconds=600.0):
+    conn = connect(db_path)
+    with conn:
+        cursor = conn.execute("UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                              (time.time() + lease_seconds, task_id, worker_id, RUNNING))
+    conn.close()
+    return cursor.rowcount == 1
+
+# Commit the result, only the worker holding the lease is allowed to do it
+def complete_task(db_path, task_id, worker_id, result):
+    conn = connect(db_path)
+    with conn:
+        cursor = conn.execute("UPDATE tasks SET status = ?, result = ?, lease_until = NULL WHERE id = ? AND worker = ? AND status = ?",
+                              (DONE, json.dumps(result), task_id, worker_id, RUNNING))
+    conn.close()
+    return cursor.rowcount == 1
+
+# Give the task back to the queue after an error, it fails for good after max_attempts
+def fail_task(db_path, task_id, worker_id, error, max_attempts=3):
+    conn = connect(db_path)
+    with conn:
+        conn.execute("""
+            UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, worker = NULL, lease_until = NULL
+            WHERE id = ? AND worker = ? AND status = ?""", (max_attempts, FAILED, PENDING, error, task_id, worker_id, RUNNING))
+    conn.close()
+
+# Seed of one trial, hashed from everything which identifies it, so the trials of different months and phis
+# are independent while a retried task still gives the same numbers
+def trial_seed(kind, month, phi, trial):
+    key = f"{kind}:{month}:{float(phi)!r}:{trial}".encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "big")
+
+# Run the trials of one task, each trial is seeded with trial_seed.
+# Returns None if the lease was lost meanwhile, the task then belongs to another worker.
+def run_task(task, graph_cache, lease_lost=None):
+    month = task["month"]
+    # The month was rebuilt after the task was submitted, its trials would be mixed with the old ones
+    if task["fingerprint"] != source_fingerprint(month, load_manifest()):
+        raise ValueError(f"Month {month} changed since the task was submitted, submit the sweep again")
+    if month not in graph_cache:
+        graph_cache.clear()  # tasks are ordered by month, so keeping one graph is enough
+        graph_cache[month] = S_phi_edges.load_monthly_network(month)
+    graph = graph_cache[month]
+
+    single_iteration = TASK_KINDS[task["kind"]]
+    initial_size = giant_component_size(month)
+    trials = []
+    for trial in range(task["seed_start"], task["seed_stop"]):
+        if lease_lost is not None and lease_lost.is_set():
+            return None
+        random.seed(trial_seed(task["kind"], month, task["phi"], trial))
+        initial_size, final_size = single_iteration(graph, task["phi"], initial_size)
+        trials.append([initial_size, final_size])
+    return trials
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# Renew the lease every lease_seconds / 3 until the task is finished, sets lease_lost if another worker took it
+def keep_lease(db_path, task_id, worker_id, lease_seconds, finished, lease_lost):
+    while not finished.wait(lease_seconds / 3):
+        if not renew_lease(db_path, task_id, worker_id, lease_seconds):
+            lease_lost.set()
+            return
+
+# Worker loop: claim, run and commit tasks until the queue is empty
+def run_worker(db_path, worker_id=None, lease_seconds=600.0, max_attempts=3, poll_interval=5.0, exit_when_empty=True):
+    worker_id = worker_id or default_worker_id()
+    graph_cache = {}
+    num_done = 0
+    while True:
+        task = claim_task(db_path, worker_id, lease_seconds, max_attempts)
+        if task is None:
+            if exit_when_empty and count_open_tasks(db_path) == 0:
+                break
+            time.sleep(poll_interval)  # other workers still hold leases which may expire
+            continue
+        # Heartbeat, so a task running longer than one lease is not handed to another worker
+        finished = threading.Event()
+        lease_lost = threading.Event()
+        heartbeat = threading.Thread(target=keep_lease, args=(db_path, task["id"], worker_id, lease_seconds, finished, lease_lost), daemon=True)
+        heartbeat.start()
+        try:
+            result = run_task(task, graph_cache, lease_lost)
+        except Exception as error:
+            fail_task(db_path, task["id"], worker_id, repr(error), max_attempts)
+            continue
+        finally:
+            finished.set()
+            heartbeat.join()
+        if result is None or lease_lost.is_set():
+            continue  # another worker owns the task now
+        if complete_task(db_path, task["id"], worker_id, result):
+            num_done += 1
+    return num_done
+
+def count_open_tasks(db_path):
+    conn = connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM tasks WHERE status IN (?, ?)", (PENDING, RUNNING)).fetchone()[0]
+    conn.close()
+    return count
+
+def queue_status(db_path):
+    conn = connect(db_path)
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+    conn.close()
+    return counts
+
+# Start several worker processes on this machine, they behave exactly like workers on other nodes
+def run_local_workers(db_path, num_workers=None, lease_seconds=600.0, max_attempts=3, poll_interval=1.0):
+    num_workers = num_workers or os.cpu_count()
+    refresh_catalog()
+    processes = [mp.Process(target=run_worker, args=(db_path, f"{default_worker_id()}-{i}", lease_seconds, max_attempts, poll_interval))
+                 for i in range(num_workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+# Average the committed trials per (month, phi), same numbers as percolation() in S_phi_edges.py
+def collect_results(db_path, kind="edges"):
+    conn = connect(db_path)
+    rows = conn.execute("SELECT month, phi, result FROM tasks WHERE kind = ? AND status = ? ORDER BY month, phi", (kind, DONE)).fetchall()
+    conn.close()
+
+    trials = {}
+    for month, phi, result in rows:
+        trials.setdefault((month, phi), []).extend(json.loads(result))
+
+    results = {}
+    for key, sizes in trials.items():
+        average_initial_size = sum(size[0] for size in sizes) / len(sizes)
+        average_final_size = sum(size[1] for size in sizes) / len(sizes)
+        results[key] = (average_initial_size, average_final_size, len(sizes))
+    return results
+
+def all_months():
+    # Generate date range from 1999-05 to 2002-05
+    date_range = pd.date_range(start='1999-05', end='2002-06', freq='ME')
+    return date_range.strftime('%Y-%m').tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared work queue for the percolation sweeps")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit = subparsers.add_parser("submit")
+    submit.add_argument("db_path")
+    submit.add_argument("--kind", choices=sorted(TASK_KINDS), default="edges")
+    submit.add_argument("--months", nargs="*", default=None)
+    submit.add_argument("--trials", type=int, default=500)
+    submit.add_argument("--chunk", type=int, default=50)
+    submit.add_argument("--step", type=float, default=0.01)
+
+    for name in ("worker", "local"):
+        worker = subparsers.add_parser(name)
+        worker.add_argument("db_path")
+        worker.add_argument("--lease", type=float, default=600.0)
+        worker.add_argument("--max-attempts", type=int, default=3)
+        if name == "local":
+            worker.add_argument("--workers", type=int, default=None)
+
+    collect = subparsers.add_parser("collect")
+    collect.add_argument("db_path")
+    collect.add_argument("--kind", choices=sorted(TASK_KINDS), default="edges")
+
+    args = parser.parse_args()
+    if args.command == "submit":
+        phis = [round(x * args.step, 5) for x in range(int(1.0 / args.step) + 1)]
+        num_tasks = submit_sweep(args.db_path, args.kind, args.months or all_months(), phis, args.trials, args.chunk)
+        print(f"Submitted {num_tasks} tasks, queue status: {queue_status(args.db_path)}")
+    elif args.command == "worker":
+        num_done = run_worker(args.db_path, lease_seconds=args.lease, max_attempts=args.max_attempts)
+        print(f"Worker finished {num_done} tasks")
+    elif args.command == "local":
+        run_local_workers(args.db_path, args.workers, args.lease, args.max_attempts)
+        print(f"Queue status: {queue_status(args.db_path)}")
+    else:
+        for (month, phi), (initial_size, final_size, num_trials) in sorted(collect_results(args.db_path, args.kind).items()):
+            print(f"Month: {month}, Phi: {phi}, Initial Size: {initial_size}, Final Size: {final_size}, Trials: {num_trials}")
+
+if __name__ == "__main__":
+    main()